@@ -19,6 +19,10 @@ setup(
         'Flask',
         'certifi',
     ],
+    extras_require={
+        'fast': ['orjson'],
+        'server': ['waitress'],
+    },
     entry_points={
         'console_scripts': [
             'udown = udown.main:cli',
@@ -1,9 +1,9 @@
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 from click.testing import CliRunner
 
-from udown.main import cli
+from udown.main import CliProgressHook, cli
 
 @pytest.fixture
 def runner():
@@ -32,6 +32,84 @@ def test_download_calls_downloader(mock_download_playlist, runner):
     assert kwargs["playlist_url"] == "http://fake-playlist-url.com"
     assert kwargs["name_template"] == "{playlist_index:02d}.{ext}"
     assert str(kwargs["output_dir"]).endswith("out")
+    assert kwargs["concurrent_downloads"] == 4
+
+
+@patch("udown.main.downloader.download_playlist")
+@patch("udown.main.downloader.download_batch")
+def test_batch_uses_single_session(mock_download_batch, mock_download_playlist, runner):
+    mock_download_batch.return_value = 0
+    with runner.isolated_filesystem():
+        result = runner.invoke(cli, ["download", "http://a", "http://b", "--batch", "--output-dir", "out"])
+
+    assert result.exit_code == 0
+    assert "Batch download finished." in result.output
+    assert mock_download_batch.call_args.kwargs["playlist_urls"] == ["http://a", "http://b"]
+    mock_download_playlist.assert_not_called()
+
+
+@patch("udown.main.downloader.download_batch")
+def test_batch_warns_about_ignored_options(mock_download_batch, runner):
+    mock_download_batch.return_value = 0
+    with runner.isolated_filesystem():
+        result = runner.invoke(cli, ["download", "http://a", "--batch", "-j", "2", "--output-dir", "out"])
+
+    assert result.exit_code == 0
+    assert "--batch ignores --concurrent, --concurrency and --refresh-metadata" in result.output
+
+
+@patch("udown.main.downloader.download_playlist")
+def test_download_counts_unique_urls(mock_download_playlist, runner):
+    mock_download_playlist.return_value = {"title": "Test Playlist"}
+    with runner.isolated_filesystem():
+        result = runner.invoke(cli, ["download", "http://a", "http://a", "--output-dir", "out"])
+
+    assert result.exit_code == 0
+    assert "Processing playlist 1/1" in result.output
+    assert mock_download_playlist.call_count == 1
+
+
+@patch("udown.main.downloader.download_playlist")
+def test_download_reads_input_file_and_stdin(mock_download_playlist, runner):
+    mock_download_playlist.return_value = {"title": "Test Playlist"}
+    with runner.isolated_filesystem():
+        with open("urls.txt", "wb") as f:
+            f.write(b"http://a\r\n\r\n  \r\nhttp://b\r\nhttp://a\r\n")
+        result = runner.invoke(
+            cli,
+            ["download", "http://a", "--input-file", "urls.txt", "--output-dir", "out"],
+            input="http://c\n\nhttp://b\nhttp://d\n",
+        )
+
+    assert result.exit_code == 0
+    assert [c.kwargs["playlist_url"] for c in mock_download_playlist.call_args_list] == [
+        "http://a", "http://b", "http://c", "http://d",
+    ]
+    assert "Processing playlist 1/2+" in result.output
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+@patch("udown.main.downloader.download_playlist")
+def test_playlists_share_one_progress_hook(mock_download_playlist, jobs, runner):
+    mock_download_playlist.return_value = {"title": "Test Playlist"}
+    with runner.isolated_filesystem():
+        result = runner.invoke(cli, ["download", "http://a", "http://b", "-j", jobs, "--output-dir", "out"])
+
+    assert result.exit_code == 0
+    hooks = {id(c.kwargs["progress_hook"]) for c in mock_download_playlist.call_args_list}
+    assert len(hooks) == 1
+
+
+@patch("udown.main.downloader.download_playlist")
+def test_download_processes_playlists_concurrently(mock_download_playlist, runner):
+    mock_download_playlist.side_effect = lambda **kwargs: {"title": kwargs["playlist_url"]}
+    with runner.isolated_filesystem():
+        result = runner.invoke(cli, ["download", "http://a", "http://b", "http://c", "-j", "2", "--output-dir", "out"])
+
+    assert result.exit_code == 0
+    assert sorted(c.kwargs["playlist_url"] for c in mock_download_playlist.call_args_list) == ["http://a", "http://b", "http://c"]
+    for url in ("http://a", "http://b", "http://c"):
+        assert f"Successfully downloaded playlist: '{url}'" in result.output
 
 
 def test_no_url_provided(runner):
@@ -61,3 +139,24 @@ def test_format_versions_calls_formatter(mock_format_versions, runner):
 
     kwargs = mock_format_versions.call_args.kwargs
     assert kwargs["allowed_suffixes"] == (".mp3",)
+    assert kwargs["link_mode"] == "copy"
+
+
+@patch("udown.main.click.progressbar")
+def test_progress_hook_draws_one_bar_for_concurrent_videos(mock_progressbar):
+    mock_progressbar.side_effect = lambda **kwargs: MagicMock()
+    hook = CliProgressHook()
+
+    def tick(video_id, status="downloading"):
+        hook({"status": status, "info_dict": {"id": video_id, "title": video_id, "_filename": video_id},
+              "downloaded_bytes": 5, "total_bytes": 10})
+
+    tick("a")
+    tick("b")
+    tick("a")
+    assert mock_progressbar.call_count == 1
+
+    tick("a", "finished")
+    tick("b")
+    assert mock_progressbar.call_count == 2
+    assert mock_progressbar.call_args.kwargs["label"] == "-> Downloading 'b'"
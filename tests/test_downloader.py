@@ -0,0 +1,255 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from udown import downloader
+
+
+def test_playlist_info_cache_roundtrip_and_ttl(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(downloader, "_CACHE_ROOT", tmp_path)
+    url = "https://www.youtube.com/playlist?list=abc"
+
+    assert downloader._load_cached_playlist_info(url) is None
+
+    info = {"title": "Playlist", "entries": [{"id": "x", "title": "X"}]}
+    downloader._store_cached_playlist_info(url, info)
+    assert downloader._load_cached_playlist_info(url) == info
+
+    # A run with cookies may see more entries, so it must not reuse the anonymous listing.
+    assert downloader._load_cached_playlist_info(url, "cookies.txt") is None
+
+    stale = time.time() - downloader._META_CACHE_TTL - 1
+    os.utime(downloader._metadata_cache_path(url), (stale, stale))
+    assert downloader._load_cached_playlist_info(url) is None
+
+
+def test_common_opts_skip_cachedir_when_cache_root_is_unwritable(tmp_path: Path, monkeypatch) -> None:
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    monkeypatch.setattr(downloader, "_CACHE_ROOT", blocker)
+
+    opts = downloader._get_common_opts(lambda d: None, None, "info", downloader.YtdlpLogger())
+    assert opts["cachedir"] is False
+
+
+def test_compile_name_template_matches_placeholder_semantics() -> None:
+    name_format = downloader._compile_name_template("{playlist_index:02d} - {title} {uploader}.{ext}")
+    assert name_format.format(playlist_index=7, title="Hello") == "07 - Hello {uploader}.%(ext)s"
+
+    assert downloader._compile_name_template("{playlist_index}").format(playlist_index=3, title="x") == "3.%(ext)s"
+
+
+def test_to_ytdlp_template_translates_placeholders() -> None:
+    assert downloader._to_ytdlp_template("{playlist_index:02d} - {title}.{ext}") == "%(playlist_index)02d - %(title)s.%(ext)s"
+    assert downloader._to_ytdlp_template("{playlist_index}") == "%(playlist_index)s.%(ext)s"
+
+
+def test_sanitize_filename_keeps_unicode_alphanumerics() -> None:
+    assert downloader.sanitize_filename("Surah: Al-Fatiha (1)! ") == "Surah AlFatiha 1"
+    assert downloader.sanitize_filename("سورة الفاتحة?") == "سورة الفاتحة"
+
+
+def test_write_metadata_compact_and_pretty(tmp_path: Path) -> None:
+    info = {"title": "Playlist", "entries": [{"id": "x"}]}
+
+    compact = tmp_path / "compact.json"
+    downloader._write_metadata(compact, info)
+    assert json.loads(compact.read_text(encoding="utf-8")) == info
+    assert "\n" not in compact.read_text(encoding="utf-8")
+
+    pretty = tmp_path / "pretty.json"
+    downloader._write_metadata(pretty, info, pretty=True)
+    assert json.loads(pretty.read_text(encoding="utf-8")) == info
+    assert "\n  " in pretty.read_text(encoding="utf-8")
+
+
+def test_postprocess_file_swaps_part_file_and_removes_source(tmp_path: Path) -> None:
+    src = tmp_path / "01 - Video.webm"
+    src.write_bytes(b"source")
+    commands = []
+
+    def fake_run(cmd, check, capture_output):
+        commands.append(cmd)
+        Path(cmd[-1]).write_bytes(b"converted")  # ffmpeg writes the .part file
+
+    with patch("udown.downloader.subprocess.run", side_effect=fake_run):
+        downloader._postprocess_file(src, "mp3")
+
+    assert commands == [[
+        "ffmpeg", "-nostdin", "-y", "-loglevel", "error", "-i", str(src),
+        "-vn", "-codec:a", "libmp3lame", "-b:a", "192k", "-f", "mp3", str(tmp_path / "01 - Video.mp3.part"),
+    ]]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["01 - Video.mp3"]
+    assert (tmp_path / "01 - Video.mp3").read_bytes() == b"converted"
+
+
+def test_postprocess_file_remuxes_to_mp4_and_skips_matching_extension(tmp_path: Path) -> None:
+    assert downloader._ffmpeg_command(Path("a.mkv"), Path("a.mp4.part"), None)[-5:] == ["-c", "copy", "-f", "mp4", "a.mp4.part"]
+
+    src = tmp_path / "video.MP4"
+    src.write_bytes(b"source")
+    with patch("udown.downloader.subprocess.run") as mock_run:
+        downloader._postprocess_file(src, None)
+    mock_run.assert_not_called()
+    assert src.read_bytes() == b"source"
+
+
+class _FakeYoutubeDL:
+    """Stands in for yt_dlp.YoutubeDL; keeps the params dict it is given, as the real class does."""
+
+    playlist: dict = {}
+    downloads: dict = {}
+    interrupt = False
+    info_params: dict = {}
+    lock = threading.Lock()
+
+    sanitize_info = staticmethod(lambda info: info)
+
+    def __init__(self, params):
+        self.params = params
+        params.setdefault("outtmpl", {})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def extract_info(self, url, download=True):
+        if not download:
+            _FakeYoutubeDL.info_params = self.params
+            return self.playlist
+        if self.interrupt:
+            raise KeyboardInterrupt
+        time.sleep(0.01)  # let the other workers rewrite their templates meanwhile
+        filepath = self.params["outtmpl"]["default"].replace("%(ext)s", "mp4")
+        with self.lock:
+            self.downloads[url] = filepath
+        return {"requested_downloads": [{"filepath": filepath}]}
+
+
+def _download(tmp_path: Path, concurrent_downloads: int, stop_event=None, save_metadata=False) -> None:
+    downloader.download_playlist(
+        playlist_url="https://example.com/playlist",
+        output_dir=tmp_path / "out",
+        quality="best",
+        name_template="{playlist_index:02d} - {title}.{ext}",
+        cookies_file=None,
+        log_level="info",
+        save_metadata=save_metadata,
+        progress_hook=lambda d: None,
+        logger=downloader.YtdlpLogger(),
+        concurrent_downloads=concurrent_downloads,
+        refresh_metadata=True,
+        stop_event=stop_event,
+    )
+
+
+def test_download_playlist_keeps_entries_apart_across_workers(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(downloader, "_CACHE_ROOT", tmp_path / "cache")
+    monkeypatch.setattr(downloader.yt_dlp, "YoutubeDL", _FakeYoutubeDL)
+    monkeypatch.setattr(downloader, "_which_cached", lambda name: "/usr/bin/ffmpeg" if name == "ffmpeg" else None)
+    postprocessed = []
+    monkeypatch.setattr(downloader, "_postprocess_file", lambda src, fmt: postprocessed.append(src.name))
+
+    entries = [{"id": f"v{i}", "title": f"Video {i}", "url": f"https://example.com/v{i}"} for i in range(1, 9)]
+    _FakeYoutubeDL.playlist = {"title": "Playlist", "entries": entries}
+    _FakeYoutubeDL.downloads = {}
+
+    _download(tmp_path, concurrent_downloads=4)
+
+    expected = {f"https://example.com/v{i}": f"{i:02d} - Video {i}.mp4" for i in range(1, 9)}
+    assert {url: Path(path).name for url, path in _FakeYoutubeDL.downloads.items()} == expected
+    assert sorted(postprocessed) == sorted(expected.values())
+
+
+def test_download_playlist_interrupt_cancels_queued_entries(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(downloader, "_CACHE_ROOT", tmp_path / "cache")
+    monkeypatch.setattr(downloader.yt_dlp, "YoutubeDL", _FakeYoutubeDL)
+    monkeypatch.setattr(downloader, "_which_cached", lambda name: None)
+    attempts = []
+    download_one = downloader._download_one
+    monkeypatch.setattr(downloader, "_download_one", lambda *args: attempts.append(args) or download_one(*args))
+
+    entries = [{"id": f"v{i}", "title": f"Video {i}", "url": f"https://example.com/v{i}"} for i in range(1, 9)]
+    _FakeYoutubeDL.playlist = {"title": "Playlist", "entries": entries}
+    _FakeYoutubeDL.interrupt = True
+    try:
+        with pytest.raises(KeyboardInterrupt):
+            _download(tmp_path, concurrent_downloads=1)
+    finally:
+        _FakeYoutubeDL.interrupt = False
+
+    assert len(attempts) == 1
+
+
+def test_download_playlist_stop_event_skips_entries(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(downloader, "_CACHE_ROOT", tmp_path / "cache")
+    monkeypatch.setattr(downloader.yt_dlp, "YoutubeDL", _FakeYoutubeDL)
+    monkeypatch.setattr(downloader, "_which_cached", lambda name: None)
+
+    entries = [{"id": f"v{i}", "title": f"Video {i}", "url": f"https://example.com/v{i}"} for i in range(1, 9)]
+    _FakeYoutubeDL.playlist = {"title": "Playlist", "entries": entries}
+    _FakeYoutubeDL.downloads = {}
+    stop_event = threading.Event()
+    stop_event.set()
+
+    with pytest.raises(RuntimeError, match="cancelled"):
+        _download(tmp_path, concurrent_downloads=4, stop_event=stop_event)
+    assert _FakeYoutubeDL.downloads == {}
+
+
+def test_download_playlist_save_metadata_uses_full_extraction(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(downloader, "_CACHE_ROOT", tmp_path / "cache")
+    monkeypatch.setattr(downloader.yt_dlp, "YoutubeDL", _FakeYoutubeDL)
+    monkeypatch.setattr(downloader, "_which_cached", lambda name: None)
+    _FakeYoutubeDL.playlist = {"title": "Playlist", "entries": [{"id": "v1", "title": "Video 1", "url": "https://example.com/v1"}]}
+
+    _download(tmp_path, concurrent_downloads=1)
+    assert _FakeYoutubeDL.info_params["extract_flat"] == "in_playlist"
+
+    _download(tmp_path, concurrent_downloads=1, save_metadata=True)
+    assert _FakeYoutubeDL.info_params["extract_flat"] is False
+    assert json.loads((tmp_path / "out" / "Playlist" / "playlist_metadata.json").read_text(encoding="utf-8"))["title"] == "Playlist"
+
+
+def test_download_playlist_stop_skips_queued_postprocessing(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(downloader, "_CACHE_ROOT", tmp_path / "cache")
+    monkeypatch.setattr(downloader.yt_dlp, "YoutubeDL", _FakeYoutubeDL)
+    monkeypatch.setattr(downloader, "_which_cached", lambda name: "/usr/bin/ffmpeg" if name == "ffmpeg" else None)
+    stop_event = threading.Event()
+    converted = []
+
+    def slow_postprocess(src, fmt):
+        converted.append(src.name)
+        stop_event.set()  # cancel while the first conversion runs
+        time.sleep(0.2)
+
+    monkeypatch.setattr(downloader, "_postprocess_file", slow_postprocess)
+    entries = [{"id": f"v{i}", "title": f"Video {i}", "url": f"https://example.com/v{i}"} for i in range(1, 9)]
+    _FakeYoutubeDL.playlist = {"title": "Playlist", "entries": entries}
+    _FakeYoutubeDL.downloads = {}
+
+    with pytest.raises(RuntimeError, match="cancelled"):
+        _download(tmp_path, concurrent_downloads=4, stop_event=stop_event)
+    assert len(converted) == 1
+
+
+def test_download_playlist_prefers_webpage_url(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(downloader, "_CACHE_ROOT", tmp_path / "cache")
+    monkeypatch.setattr(downloader.yt_dlp, "YoutubeDL", _FakeYoutubeDL)
+    monkeypatch.setattr(downloader, "_which_cached", lambda name: None)
+    entry = {"id": "v1", "title": "Video 1", "url": "https://cdn.example.com/v1.mp4?expires=1", "webpage_url": "https://example.com/v1"}
+    _FakeYoutubeDL.playlist = {"title": "Playlist", "entries": [entry]}
+    _FakeYoutubeDL.downloads = {}
+
+    _download(tmp_path, concurrent_downloads=1)
+    assert list(_FakeYoutubeDL.downloads) == ["https://example.com/v1"]
@@ -38,3 +38,14 @@ def test_format_versions_ascii_safe_fallback(tmp_path: Path) -> None:
     out = [p.name for p in target_root.iterdir()]
     assert out == ["001 - track.mp3"]
 
+
+def test_format_versions_hardlink_mode(tmp_path: Path) -> None:
+    source_root = tmp_path / "quran_Serailler"
+    (source_root / "Version_1").mkdir(parents=True)
+    src = source_root / "Version_1" / "a.mp3"
+    src.write_bytes(b"a")
+
+    target_root = tmp_path / "serialized"
+    total = format_versions(source_root=source_root, target_root=target_root, start_version=1, end_version=1, link_mode="hardlink")
+    assert total == 1
+    assert (target_root / "001 - a.mp3").stat().st_ino == src.stat().st_ino
@@ -0,0 +1,73 @@
+import json
+import queue
+from unittest.mock import patch
+
+from udown.web import _FINISHED, WebProgressHook, _queue_put, _sse, create_app
+
+
+def test_progress_hook_throttles_but_keeps_first_and_last_frames() -> None:
+    q: queue.Queue = queue.Queue()
+    hook = WebProgressHook(q)
+    info = {"id": "abc", "title": "Video"}
+    for downloaded in range(0, 100_001, 10):
+        hook({"status": "downloading", "info_dict": info, "downloaded_bytes": downloaded, "total_bytes": 100_000})
+
+    messages = list(q.queue)
+    assert messages[0].startswith(b"event: new_video")
+    assert b'"progress":"100.0"' in messages[-1]
+    assert len(messages) < 500
+
+
+def test_progress_hook_finished_closes_bar_at_100() -> None:
+    q: queue.Queue = queue.Queue()
+    hook = WebProgressHook(q)
+    info = {"id": "abc", "title": "Video", "_filename": "video.mp4"}
+    hook({"status": "downloading", "info_dict": info, "downloaded_bytes": 100, "total_bytes_estimate": 1000})
+    hook({"status": "downloading", "info_dict": info, "downloaded_bytes": 102, "total_bytes_estimate": 1000})  # throttled
+    hook({"status": "finished", "info_dict": info, "downloaded_bytes": 990})
+
+    progress = [json.loads(m.split(b"data: ", 1)[1]) for m in q.queue if m.startswith(b"event: progress")]
+    assert [p["progress"] for p in progress] == ["10.0", "100.0"]
+
+
+def test_progress_payload_escapes_unsafe_strings() -> None:
+    q: queue.Queue = queue.Queue()
+    hook = WebProgressHook(q)
+    hook({
+        "status": "downloading",
+        "info_dict": {"id": "abc", "title": "Video"},
+        "downloaded_bytes": 5,
+        "total_bytes": 10,
+        "_speed_str": "\x1b[0;32m1.0MiB/s\x1b[0m",
+    })
+
+    frame = list(q.queue)[-1]
+    payload = json.loads(frame.split(b"data: ", 1)[1])
+    assert payload == {"video_id": "abc", "progress": "50.0", "speed": "\x1b[0;32m1.0MiB/s\x1b[0m", "eta": "N/A"}
+
+
+def test_queue_put_sheds_progress_when_half_full() -> None:
+    q: queue.Queue = queue.Queue(maxsize=4)
+    for _ in range(3):
+        _queue_put(q, b"message")
+
+    _queue_put(q, b"progress", droppable=True)
+    assert q.qsize() == 3
+
+    _queue_put(q, b"finished")
+    assert q.qsize() == 4
+
+
+def test_stream_coalesces_queued_events_until_finished() -> None:
+    client = create_app().test_client()
+    with patch("udown.web.threading.Thread") as mock_thread:
+        job_id = client.post("/download", data={"playlist_url": "http://x"}).get_json()["job_id"]
+    job_queue = mock_thread.call_args.kwargs["args"][0]
+    job_queue.put(_sse("message", "one"))
+    job_queue.put(_sse("message", "two"))
+    job_queue.put(_FINISHED)
+
+    response = client.get(f"/stream/{job_id}")
+    chunks = list(response.iter_encoded())
+    assert len(chunks) == 1
+    assert chunks[0].count(b"event: ") == 3
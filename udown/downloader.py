@@ -1,8 +1,35 @@
 import yt_dlp
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+import hashlib
 import json
 import certifi
+import functools
+import os
+import queue
+import re
 import shutil
+import string
+import subprocess
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:  # optional: pip install udown[fast]
+    orjson = None
+
+_CACHE_ROOT = Path(os.environ.get('UDOWN_CACHE_DIR') or Path.home() / '.cache' / 'udown')
+_META_CACHE_TTL = 3600  # seconds
+# Resolved once per process; certifi.where() may unpack the bundle from package resources.
+_CA_FILE = certifi.where()
+# Serializes loading and saving of a --cookies-file shared by concurrent YoutubeDL instances.
+_COOKIE_FILE_LOCK = threading.Lock()
+# Everything except Unicode alphanumerics, '_', ' ' and '.' (same set as str.isalnum() + ' ._').
+_UNSAFE_FILENAME_RE = re.compile(r'[^\w .]+')
+# ASCII-only titles take a str.translate fast path that deletes the same characters.
+_SAFE_ASCII = frozenset(string.ascii_letters + string.digits + ' ._')
+_ASCII_FILENAME_TRANS = {cp: None for cp in range(128) if chr(cp) not in _SAFE_ASCII}
 
 class YtdlpLogger:
     def __init__(self, debug_fn=None, warning_fn=None, error_fn=None):
@@ -19,30 +46,95 @@ class YtdlpLogger:
     def error(self, msg):
         self._error(msg)
 
+_FORMAT_SELECTIONS = {
+    'audio-only': 'bestaudio/best',
+    'best': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+}
+
 def get_format_selection(quality: str) -> str:
     """Returns the yt-dlp format selection string based on the quality."""
-    if quality == 'audio-only':
-        return 'bestaudio/best'
-    if quality == 'best':
-        return 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+    selection = _FORMAT_SELECTIONS.get(quality)
+    if selection is not None:
+        return selection
     if quality.endswith('p'):
         height = quality[:-1]
         return f'bestvideo[height<={height}][ext=mp4]+bestaudio[ext=m4a]/best[height<={height}][ext=mp4]/best'
     return quality
 
+@functools.lru_cache(maxsize=4096)
 def sanitize_filename(name):
     """Sanitize a string to be a valid filename."""
-    return "".join(c for c in name if c.isalnum() or c in (' ', '.', '_')).rstrip()
+    if name.isascii():
+        return name.translate(_ASCII_FILENAME_TRANS).rstrip()
+    return _UNSAFE_FILENAME_RE.sub('', name).rstrip()
+
+@functools.lru_cache(maxsize=None)
+def _which_cached(name: str):
+    """shutil.which, memoized: tools don't appear or vanish mid-run."""
+    return shutil.which(name)
+
+def _metadata_cache_path(playlist_url: str, cookies_file: str = None) -> Path:
+    # A listing fetched with cookies can hold entries an anonymous one can't
+    # see (private/unlisted videos), so the cookies file is part of the key.
+    cookies_key = os.path.abspath(cookies_file) if cookies_file else ''
+    key = hashlib.sha256(f"{playlist_url}\0{cookies_key}".encode('utf-8')).hexdigest()
+    return _CACHE_ROOT / 'metadata' / f'{key}.json'
+
+def _load_cached_playlist_info(playlist_url: str, cookies_file: str = None):
+    """Returns cached playlist info if it is younger than the TTL, else None."""
+    path = _metadata_cache_path(playlist_url, cookies_file)
+    try:
+        if time.time() - path.stat().st_mtime >= _META_CACHE_TTL:
+            return None
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
 
-def _get_common_opts(progress_hook, cookies_file, log_level, logger):
+def _store_cached_playlist_info(playlist_url: str, playlist_info: dict, cookies_file: str = None) -> None:
+    path = _metadata_cache_path(playlist_url, cookies_file)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(yt_dlp.YoutubeDL.sanitize_info(playlist_info)), encoding='utf-8')
+        os.replace(tmp, path)
+    except (OSError, TypeError, ValueError):
+        # Caching is best-effort; a failed write only costs a refetch next run.
+        pass
+
+def _write_metadata(path: Path, playlist_info: dict, pretty: bool = False) -> None:
+    """Stream playlist info to ``path`` as compact JSON (indented when ``pretty``)."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        try:
+            path.write_bytes(orjson.dumps(playlist_info, option=option))
+            return
+        except TypeError:
+            pass  # e.g. ints beyond 64 bits; the stdlib encoder copes
+    with open(path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        if pretty:
+            json.dump(playlist_info, f, indent=2)
+        else:
+            json.dump(playlist_info, f, separators=(',', ':'))
+
+def _get_common_opts(progress_hook, cookies_file, log_level, logger, concurrent_fragments=8):
     js_runtime_map = {}
     # Prefer local runtimes to silence yt-dlp warnings and unlock more formats.
     # yt-dlp expects a dict: {runtime_name: {config}}; empty config uses PATH.
     for runtime in ('node', 'deno'):
-        runtime_path = shutil.which(runtime)
+        runtime_path = _which_cached(runtime)
         if runtime_path:
             js_runtime_map[runtime] = {'path': runtime_path}
 
+    # Persist yt-dlp's cache (player JS, signature/nsig solutions) across runs
+    # so warm invocations skip re-downloading and re-solving base.js.
+    ytdlp_cache_dir = _CACHE_ROOT / 'ytdlp'
+    try:
+        ytdlp_cache_dir.mkdir(parents=True, exist_ok=True)
+        cachedir = str(ytdlp_cache_dir)
+    except OSError:
+        # Best-effort like the metadata cache: on a read-only home, run uncached.
+        cachedir = False
+
     opts = {
         'quiet': True,
         'progress_hooks': [progress_hook],
@@ -51,109 +143,314 @@ def _get_common_opts(progress_hook, cookies_file, log_level, logger):
         'logger': logger,
         'http_headers': {'User-Agent': 'Mozilla/5.0'},
         'nocheckcertificate': False,
-        'ca_file': certifi.where(),
+        'ca_file': _CA_FILE,
+        'cachedir': cachedir,
+        # Fetch DASH/HLS segments in parallel (yt-dlp's -N); a single stream
+        # to the CDN is often throttled well below the link speed.
+        'concurrent_fragment_downloads': concurrent_fragments,
     }
     if js_runtime_map:
         opts['js_runtimes'] = js_runtime_map
         # Enable EJS solver from GitHub to satisfy YouTube's JS challenges
         opts['remote_components'] = ['ejs:github']
+    # Only persist cookies the user handed us; each pooled instance still keeps
+    # its in-memory session jar across the videos it downloads.
     if cookies_file:
         opts['cookiefile'] = cookies_file
     if log_level == 'debug':
         opts['quiet'] = False
     return opts
 
+def _new_ydl(opts: dict) -> yt_dlp.YoutubeDL:
+    ydl = yt_dlp.YoutubeDL(opts)
+    if opts.get('cookiefile'):
+        # The jar is loaded lazily on first request and rewritten in place by
+        # close(); load it now under the lock so it can't read a half-saved file.
+        with _COOKIE_FILE_LOCK:
+            ydl.cookiejar
+    return ydl
+
+def _close_ydl(ydl: yt_dlp.YoutubeDL) -> None:
+    """Close ydl, saving its cookie jar (if any) without racing other instances."""
+    with _COOKIE_FILE_LOCK:
+        ydl.close()
+
+def _ffmpeg_command(src: Path, dst: Path, audio_format: str) -> list[str]:
+    base = ['ffmpeg', '-nostdin', '-y', '-loglevel', 'error', '-i', str(src)]
+    if audio_format == 'mp3':
+        return [*base, '-vn', '-codec:a', 'libmp3lame', '-b:a', '192k', '-f', 'mp3', str(dst)]
+    return [*base, '-c', 'copy', '-f', 'mp4', str(dst)]
+
+def _postprocess_file(src: Path, audio_format: str) -> None:
+    """Converts (mp3) or remuxes (mp4) a downloaded file in place, replacing the original."""
+    target_ext = '.mp3' if audio_format == 'mp3' else '.mp4'
+    if src.suffix.lower() == target_ext:
+        return
+    dst = src.with_suffix(target_ext)
+    tmp = dst.with_name(f"{dst.name}.part")
+    subprocess.run(_ffmpeg_command(src, tmp, audio_format), check=True, capture_output=True)
+    os.replace(tmp, dst)
+    src.unlink()
+
+def _postprocess_worker(pp_queue: queue.Queue, audio_format: str, logger,
+                        stop_event: threading.Event = None) -> None:
+    """Runs ffmpeg on downloaded files until a ``None`` sentinel is received; skips them once stopped."""
+    skipped = 0
+    while True:
+        src = pp_queue.get()
+        if src is None:
+            if skipped:
+                logger.warning(f"Cancelled: skipped post-processing of {skipped} downloaded file(s).")
+            return
+        if stop_event is not None and stop_event.is_set():
+            # The backlog can hold a whole playlist's worth of conversions (one
+            # ffmpeg thread behind several downloads); don't make a cancel wait on it.
+            skipped += 1
+            continue
+        try:
+            _postprocess_file(Path(src), audio_format)
+        except subprocess.CalledProcessError as e:
+            stderr = (e.stderr or b'').decode(errors='replace').strip()
+            logger.error(f"Post-processing failed for '{src}': {stderr or e}")
+        except OSError as e:
+            logger.error(f"Post-processing failed for '{src}': {e}")
+
+def _compile_name_template(name_template: str) -> str:
+    """
+    Turn a udown name template into a ``str.format`` string, once per playlist.
+
+    Only ``{playlist_index:02d}``, ``{playlist_index}`` and ``{title}`` stay live
+    fields; any other braces are escaped so they come out literally. ``{ext}`` is
+    resolved to yt-dlp's ``%(ext)s`` so the final extension follows the format.
+    """
+    name_format = name_template.replace('{', '{{').replace('}', '}}')
+    for field in ('{playlist_index:02d}', '{playlist_index}', '{title}'):
+        name_format = name_format.replace('{' + field + '}', field)
+    # Keep extension dynamic so yt-dlp can decide based on the actual format
+    if '{ext}' in name_template:
+        name_format = name_format.replace('{{ext}}', '%(ext)s')
+    elif '%(ext)s' not in name_template:
+        name_format = f"{name_format}.%(ext)s"
+    return name_format
+
+def _fresh_containers(value):
+    """Copy nested dicts/lists so each YoutubeDL gets its own; other values (logger, hooks) stay shared."""
+    if isinstance(value, dict):
+        return {k: _fresh_containers(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fresh_containers(v) for v in value]
+    return value
+
+def _cancel_hook(stop_event: threading.Event):
+    """Progress hook that aborts an in-flight download once ``stop_event`` is set."""
+    def hook(d):
+        if stop_event.is_set():
+            raise yt_dlp.utils.DownloadCancelled()
+    return hook
+
+def _download_one(entry: dict, pos: int, ydl_pool: queue.Queue, playlist_output_path: Path, name_format: str,
+                  pp_queue: queue.Queue = None, stop_event: threading.Event = None):
+    """Downloads a single playlist entry. Returns an ``(ok, err)`` tuple; ``err`` is None if cancelled."""
+    if stop_event is not None and stop_event.is_set():
+        return False, None
+    p_index = entry.get('playlist_index') or pos
+    title = sanitize_filename(entry.get('title') or entry.get('id') or f"video_{p_index}")
+
+    filename = name_format.format(playlist_index=p_index, title=title)
+
+    final_outtmpl = str(playlist_output_path / filename)
+
+    # Prefer the page URL: on fully resolved entries 'url' is the direct media
+    # URL, which expires; flat YouTube entries only carry 'url'.
+    video_url = entry.get('webpage_url') or entry.get('url') or (f"https://www.youtube.com/watch?v={entry.get('id')}" if entry.get('id') else None)
+    if not video_url:
+        return False, f"Failed to determine URL for playlist item at position {p_index}."
+
+    # Borrow a pooled instance so extractor setup, cookies and HTTP connections
+    # carry over between videos; only the output template changes per entry.
+    ydl = ydl_pool.get()
+    try:
+        ydl.params['outtmpl']['default'] = final_outtmpl
+        info = ydl.extract_info(video_url, download=True)
+    except yt_dlp.utils.DownloadCancelled:
+        return False, None
+    except Exception as e:
+        return False, f"Failed to download video '{entry.get('title') or entry.get('id') or p_index}': {e}"
+    finally:
+        ydl_pool.put(ydl)
+
+    if pp_queue is not None and info:
+        # Hand the file to the post-processing thread so ffmpeg runs while the
+        # next download is already on the wire.
+        downloads = info.get('requested_downloads') or []
+        filepath = downloads[-1].get('filepath') if downloads else None
+        if filepath:
+            pp_queue.put(filepath)
+    return True, None
+
 def download_playlist(playlist_url: str, output_dir: Path, quality: str, name_template: str, 
-                      cookies_file: str, log_level: str, save_metadata: bool, progress_hook, logger, audio_format: str = None):
-    """Downloads a single YouTube playlist."""
-    
-    common_opts = _get_common_opts(progress_hook, cookies_file, log_level, logger)
+                      cookies_file: str, log_level: str, save_metadata: bool, progress_hook, logger, audio_format: str = None,
+                      concurrent_downloads: int = 4, refresh_metadata: bool = False, concurrent_fragments: int = 8,
+                      pretty_metadata: bool = False, stop_event: threading.Event = None):
+    """
+    Downloads a single YouTube playlist, fetching up to ``concurrent_downloads`` videos in parallel.
+
+    Setting ``stop_event`` (from another thread) skips the remaining entries and
+    aborts those in flight; the call then raises RuntimeError.
+    """
+    stop_event = stop_event or threading.Event()
     
-    # First, extract all video information from the playlist
-    info_opts = {**common_opts, 'extract_flat': False, 'force_generic_extractor': False}
+    common_opts = _get_common_opts(progress_hook, cookies_file, log_level, logger, concurrent_fragments)
     
-    try:
-        with yt_dlp.YoutubeDL(info_opts) as ydl:
+    # Enumerate the playlist cheaply (ids, titles, urls only); full per-video
+    # extraction happens in each entry's download call, so downloads start
+    # without waiting on N player/format lookups up front. --save-metadata
+    # promises per-video metadata, so it still needs the full pass, and that
+    # result is neither read from nor written to the flat-listing cache.
+    info_opts = {**common_opts, 'extract_flat': False if save_metadata else 'in_playlist'}
+    use_cache = not save_metadata
+
+    playlist_info = _load_cached_playlist_info(playlist_url, cookies_file) if use_cache and not refresh_metadata else None
+    if playlist_info is None:
+        ydl = _new_ydl(info_opts)
+        try:
             playlist_info = ydl.extract_info(playlist_url, download=False)
-    except yt_dlp.utils.DownloadError as e:
-        raise RuntimeError(f"Fatal error fetching playlist info: {e}")
+        except yt_dlp.utils.DownloadError as e:
+            raise RuntimeError(f"Fatal error fetching playlist info: {e}")
+        finally:
+            _close_ydl(ydl)
 
-    if not playlist_info or 'title' not in playlist_info:
-        raise ValueError(f"Could not retrieve playlist information for {playlist_url}. Check the URL or cookies.")
+        if not playlist_info or 'title' not in playlist_info:
+            raise ValueError(f"Could not retrieve playlist information for {playlist_url}. Check the URL or cookies.")
+        if use_cache:
+            _store_cached_playlist_info(playlist_url, playlist_info, cookies_file)
         
     playlist_title = sanitize_filename(playlist_info['title'])
     playlist_output_path = output_dir / playlist_title
     playlist_output_path.mkdir(parents=True, exist_ok=True)
 
     if save_metadata:
-        (playlist_output_path / "playlist_metadata.json").write_text(json.dumps(playlist_info, indent=4))
+        _write_metadata(playlist_output_path / "playlist_metadata.json", playlist_info, pretty_metadata)
 
     entries = list(playlist_info.get('entries') or [])
     if not entries:
         logger.warning(f"Playlist '{playlist_title}' appears to be empty. Nothing to download.")
         return playlist_info
 
+    download_opts = {
+        **common_opts,
+        'format': get_format_selection(quality),
+        'overwrites': False,  # avoid clobbering if anything goes wrong with naming
+        'progress_hooks': [_cancel_hook(stop_event), *common_opts['progress_hooks']],
+    }
+
+    # ffmpeg post-processing runs on its own thread, fed through a queue, instead of
+    # as yt-dlp postprocessors that would hold up the download slot while encoding.
+    pp_queue = None
+    ffmpeg_present = bool(_which_cached('ffmpeg'))
+    if audio_format == 'mp3' and not ffmpeg_present:
+        logger.warning("MP3 conversion requires FFmpeg to be installed on your system.")
+    if ffmpeg_present:
+        if audio_format != 'mp3':
+            download_opts['merge_output_format'] = 'mp4'
+        pp_queue = queue.Queue()
+        pp_thread = threading.Thread(target=_postprocess_worker, args=(pp_queue, audio_format, logger, stop_event),
+                                     daemon=True)
+        pp_thread.start()
+
     # Build filenames ourselves to avoid relying on yt-dlp playlist context,
     # then let yt-dlp fill in the final extension based on the selected format.
+    name_format = _compile_name_template(name_template)
+    work = []
     for pos, entry in enumerate(entries, start=1):
         if not entry:
             logger.warning("Skipping an empty entry in the playlist.")
             continue
+        work.append((pos, entry))
 
-        p_index = entry.get('playlist_index') or pos
-        title = sanitize_filename(entry.get('title') or entry.get('id') or f"video_{p_index}")
-
-        filename = name_template
-        filename = filename.replace('{playlist_index:02d}', f'{p_index:02d}')
-        filename = filename.replace('{playlist_index}', str(p_index))
-        filename = filename.replace('{title}', title)
-
-        # Keep extension dynamic so yt-dlp can decide based on the actual format
-        if '{ext}' in filename:
-            filename = filename.replace('{ext}', '%(ext)s')
-        elif '%(ext)s' not in filename:
-            filename = f"{filename}.%(ext)s"
-
-        final_outtmpl = str(playlist_output_path / filename)
-
-        download_opts = {
-            **common_opts,
-            'format': get_format_selection(quality),
-            'outtmpl': {'default': final_outtmpl},
-            'overwrites': False,  # avoid clobbering if anything goes wrong with naming
-        }
-
-        postprocessors = []
-        ffmpeg_present = bool(shutil.which('ffmpeg'))
-        if audio_format == 'mp3':
-            if not ffmpeg_present:
-                logger.warning("MP3 conversion requires FFmpeg to be installed on your system.")
-            postprocessors.append({
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            })
-        else:
-            # Remux to mp4 locally to normalize extension/container when formats differ
-            if ffmpeg_present:
-                postprocessors.append({
-                    'key': 'FFmpegVideoRemuxer',
-                    'preferredformat': 'mp4',
-                })
-                download_opts['merge_output_format'] = 'mp4'
-
-        if postprocessors:
-            download_opts['postprocessors'] = postprocessors
-
-        video_url = entry.get('webpage_url') or entry.get('url') or (f"https://www.youtube.com/watch?v={entry.get('id')}" if entry.get('id') else None)
-        if not video_url:
-            logger.error(f"Failed to determine URL for playlist item at position {p_index}.")
-            continue
-
-        try:
-            with yt_dlp.YoutubeDL(download_opts) as ydl:
-                ydl.download([video_url])
-        except Exception as e:
-            logger.error(f"Failed to download video '{entry.get('title') or entry.get('id') or p_index}': {e}")
+    # Downloads are network-bound, so a small thread pool keeps the link busy.
+    # Keep the cap modest: too many parallel requests invite YouTube rate-limiting.
+    workers = max(1, min(concurrent_downloads, len(work)))
+    ydl_pool = queue.Queue()
+    for _ in range(workers):
+        # YoutubeDL keeps the dict it is given as self.params, and _download_one
+        # rewrites params['outtmpl'] per entry, so every pooled instance needs
+        # its own copy or concurrent entries would save under each other's names.
+        ydl_pool.put(_new_ydl(_fresh_containers(download_opts)))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_download_one, entry, pos, ydl_pool, playlist_output_path, name_format, pp_queue, stop_event)
+                for pos, entry in work
+            ]
+            try:
+                for future in as_completed(futures):
+                    ok, err = future.result()
+                    if err:
+                        logger.error(err)
+            except BaseException:
+                # On Ctrl-C (or any error) drop the entries still queued and abort
+                # the running ones; leaving the with-block waits for them.
+                stop_event.set()
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+    finally:
+        while not ydl_pool.empty():
+            _close_ydl(ydl_pool.get_nowait())
+        if pp_queue is not None:
+            pp_queue.put(None)
+            pp_thread.join()
 
+    if stop_event.is_set():
+        raise RuntimeError(f"Download of playlist '{playlist_title}' was cancelled.")
     return playlist_info
+
+def _to_ytdlp_template(name_template: str) -> str:
+    """Translate udown's name template into yt-dlp output-template syntax."""
+    outtmpl = (name_template
+               .replace('{playlist_index:02d}', '%(playlist_index)02d')
+               .replace('{playlist_index}', '%(playlist_index)s')
+               .replace('{title}', '%(title)s')
+               .replace('{ext}', '%(ext)s'))
+    if '%(ext)s' not in outtmpl:
+        outtmpl = f"{outtmpl}.%(ext)s"
+    return outtmpl
+
+def download_batch(playlist_urls: list[str], output_dir: Path, quality: str, name_template: str,
+                   cookies_file: str, log_level: str, progress_hook, logger, audio_format: str = None,
+                   concurrent_fragments: int = 8) -> int:
+    """
+    Downloads several playlists through one YoutubeDL instance (yt-dlp's batch-file mode).
+
+    Skips the per-playlist setup of download_playlist, but files are named by yt-dlp
+    from its own playlist fields, post-processing runs inline and no metadata JSON is
+    written. Returns yt-dlp's exit code.
+    """
+    opts = {
+        **_get_common_opts(progress_hook, cookies_file, log_level, logger, concurrent_fragments),
+        'format': get_format_selection(quality),
+        'outtmpl': {'default': str(output_dir / '%(playlist_title)s' / _to_ytdlp_template(name_template))},
+        'overwrites': False,
+    }
+
+    postprocessors = []
+    ffmpeg_present = bool(_which_cached('ffmpeg'))
+    if audio_format == 'mp3':
+        if not ffmpeg_present:
+            logger.warning("MP3 conversion requires FFmpeg to be installed on your system.")
+        postprocessors.append({
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '192',
+        })
+    elif ffmpeg_present:
+        postprocessors.append({
+            'key': 'FFmpegVideoRemuxer',
+            'preferredformat': 'mp4',
+        })
+        opts['merge_output_format'] = 'mp4'
+    if postprocessors:
+        opts['postprocessors'] = postprocessors
+
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        return ydl.download(list(playlist_urls))
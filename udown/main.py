@@ -1,41 +1,143 @@
+import asyncio
+import itertools
 import os
+import select
 import sys
+import threading
+import time
 from pathlib import Path
 
 import click
 
 from udown import downloader, version_formatter
 
+# Playlist entries download on worker threads; serialize terminal output so
+# progress bars and log lines don't interleave mid-write.
+_output_lock = threading.Lock()
+
+
+def _secho(message, **styles):
+    with _output_lock:
+        click.secho(message, **styles)
+
+
 class CliProgressHook:
+    # yt-dlp reports progress many times a second; redrawing the bar each time
+    # (ETA maths, ANSI formatting, terminal write) costs more than the hook itself.
+    min_render_interval = 1 / 20
+    # Several videos download at once, but a click bar redraws the current
+    # terminal line, so only one bar is drawn at a time. Another video takes
+    # the line when that one finishes, or has gone quiet this long (it failed).
+    stall_timeout = 5.0
+
     def __init__(self):
-        self.pbar = None
-        self.current_video_id = None
+        self._video_id = None
+        self._pbar = None
+        self._last_tick = 0.0
+        self._last_render = 0.0
 
     def __call__(self, d):
+        with _output_lock:
+            self._handle(d)
+
+    def _handle(self, d):
+        video_id = d['info_dict']['id']
+        now = time.monotonic()
         if d['status'] == 'downloading':
-            video_id = d['info_dict']['id']
-            if self.current_video_id != video_id:
-                self.current_video_id = video_id
-                if self.pbar:
-                    self.pbar.finish()
-                
+            if video_id != self._video_id:
+                if self._pbar is not None and now - self._last_tick < self.stall_timeout:
+                    return
+                self._finish_bar()
                 total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
                 video_title = d['info_dict']['title']
-                self.pbar = click.progressbar(length=total_bytes, label=f"-> Downloading '{video_title}'")
-                self.pbar.update(0)
+                self._video_id = video_id
+                self._pbar = click.progressbar(length=total_bytes, label=f"-> Downloading '{video_title}'")
+                self._pbar.update(0)
 
-            if self.pbar:
-                self.pbar.pos = d['downloaded_bytes']
-                self.pbar.render_progress()
+            self._last_tick = now
+            self._pbar.pos = d['downloaded_bytes']
+            if now - self._last_render < self.min_render_interval and d['downloaded_bytes'] != d.get('total_bytes'):
+                return
+            self._last_render = now
+            self._pbar.render_progress()
 
         elif d['status'] == 'finished':
-            if self.pbar:
-                self.pbar.finish()
+            if video_id == self._video_id:
+                # Draw the final state even if the last tick was throttled
+                self._pbar.pos = d.get('downloaded_bytes') or self._pbar.pos
+                self._pbar.render_progress()
+                self._finish_bar()
             click.echo(f"\n -> Download finished: {d['info_dict']['_filename']}")
-    
+
+    def _finish_bar(self):
+        if self._pbar is not None:
+            self._pbar.finish()
+        self._video_id = self._pbar = None
+
     def close(self):
-        if self.pbar:
-            self.pbar.finish()
+        """Finish the bar left open, if any."""
+        with _output_lock:
+            self._finish_bar()
+            self._last_render = 0.0
+
+
+def _read_url_file(path):
+    """Return the non-blank lines of path, read in one go and decoded per line."""
+    data = Path(path).read_bytes()
+    return [line.decode("utf-8") for line in data.splitlines() if line.strip()]
+
+
+def _stdin_lines():
+    # Only read piped input; on an interactive terminal this would block for typing.
+    if not sys.stdin.isatty():
+        yield from sys.stdin
+
+
+def _stdin_may_have_input():
+    """False when stdin is a terminal or already at EOF (e.g. /dev/null under cron), else True."""
+    if sys.stdin.isatty():
+        return False
+    try:
+        readable, _, _ = select.select([sys.stdin], [], [], 0)
+        if not readable:
+            return True  # an open pipe whose writer hasn't sent anything yet
+        # Readable means data or EOF; peek tells them apart without consuming.
+        return bool(sys.stdin.buffer.peek(1))
+    except (AttributeError, OSError, ValueError):
+        # No real descriptor (e.g. a replaced stdin) or select() can't poll it
+        # (Windows pipes): assume more URLs may follow.
+        return True
+
+
+def _iter_urls(playlist_urls, file_urls):
+    """Lazily yield unique playlist URLs from arguments, --input-file lines and piped stdin, in order."""
+    # A running seen-set rather than dict.fromkeys(): the latter would have to
+    # read stdin to EOF before the first playlist could start.
+    seen = set()
+    for url in itertools.chain(playlist_urls, file_urls, _stdin_lines()):
+        url = url.strip()
+        if url and url not in seen:
+            seen.add(url)
+            yield url
+
+
+async def _run_playlists(urls, concurrency, process, stop_event):
+    """Run ``process(i, url)`` in threads, at most ``concurrency`` playlists at a time."""
+    # Workers pull from one shared iterator, so URLs are still read lazily.
+    numbered = enumerate(urls, 1)
+
+    async def worker():
+        for i, url in numbered:
+            await asyncio.to_thread(process, i, url)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    except asyncio.CancelledError:
+        # Ctrl-C cancels this task, but asyncio.run then waits for the worker
+        # threads; tell them to stop rather than finish their playlists.
+        stop_event.set()
+        raise
+
 
 @click.group()
 def cli():
@@ -54,26 +156,37 @@ def cli():
 @click.option('--cookies-file', '-c', help='The path to a cookies file for authentication.', type=click.Path(exists=True))
 @click.option('--log-level', '-l', default='info', help='The log level (e.g., debug, info, warning, error).')
 @click.option('--save-metadata', '-m', is_flag=True, help='Save playlist and video metadata to a JSON file.')
-def download(playlist_urls, input_file, output_dir, quality, audio, to_mp3, name_template, simple_serial, cookies_file, log_level, save_metadata):
+@click.option('--pretty-metadata', is_flag=True, default=False, help='Indent the saved metadata JSON (larger file).')
+@click.option('--concurrent', 'concurrent_downloads', default=4, show_default=True, type=click.IntRange(min=1), help='Number of videos to download in parallel per playlist.')
+@click.option('--refresh-metadata', is_flag=True, default=False, help='Ignore cached playlist info and fetch it again.')
+@click.option('--concurrent-fragments', default=8, show_default=True, type=click.IntRange(min=1), help='Number of DASH/HLS fragments to fetch in parallel per video.')
+@click.option('--batch', is_flag=True, default=False, help='Hand all playlists to one yt-dlp session (faster start; yt-dlp names the files, no per-playlist progress). Ignores --concurrent, --concurrency and --refresh-metadata; ignored itself with --save-metadata.')
+@click.option('--concurrency', '-j', default=1, show_default=True, type=click.IntRange(min=1), help='Number of playlists to process in parallel.')
+def download(playlist_urls, input_file, output_dir, quality, audio, to_mp3, name_template, simple_serial, cookies_file, log_level, save_metadata, pretty_metadata, concurrent_downloads, refresh_metadata, concurrent_fragments, batch, concurrency):
     """
     Downloads videos from one or more YouTube playlists.
 
     PLAYLIST_URLS: One or more YouTube playlist URLs.
     """
-    urls = list(playlist_urls)
-    if input_file:
-        with open(input_file, "r", encoding="utf-8") as f:
-            urls.extend(line.strip() for line in f if line.strip())
-    if not sys.stdin.isatty():
-        urls.extend(line.strip() for line in sys.stdin if line.strip())
-    urls = [u.strip() for u in urls if u and u.strip()]
-    # De-duplicate while preserving order
-    seen = set()
-    urls = [u for u in urls if not (u in seen or seen.add(u))]
-
-    if not urls:
+    # Piped stdin is consumed lazily so long lists start downloading at once.
+    # The input file is finite and already on disk, so it is read with one
+    # read_bytes(), which also gives the banner total.
+    file_urls = _read_url_file(input_file) if input_file else []
+    urls = _iter_urls(playlist_urls, file_urls)
+    # Checked before next() below, which may already read from stdin.
+    stdin_pending = _stdin_may_have_input()
+    first_url = next(urls, None)
+    if first_url is None:
         click.echo("No playlist URLs provided.")
         return
+    urls = itertools.chain([first_url], urls)
+
+    # Arguments and file lines are already in memory, so count them after the
+    # same stripping and de-duplication that _iter_urls applies.
+    total = len({url.strip() for url in itertools.chain(playlist_urls, file_urls)} - {""})
+    # Piped stdin can't be counted up front; mark the total as open-ended,
+    # unless stdin is already at EOF (a plain run under cron or CI).
+    total_label = f"{total}+" if stdin_pending else str(total)
 
     base_output_path = Path(output_dir)
     base_output_path.mkdir(parents=True, exist_ok=True)
@@ -89,13 +202,44 @@ def download(playlist_urls, input_file, output_dir, quality, audio, to_mp3, name
     final_template = '{playlist_index:02d}.{ext}' if simple_serial else name_template
 
     cli_logger = downloader.YtdlpLogger(
-        warning_fn=lambda msg: click.secho(f"WARNING: {msg}", fg="yellow"),
-        error_fn=lambda msg: click.secho(f"ERROR: {msg}", fg="red")
+        warning_fn=lambda msg: _secho(f"WARNING: {msg}", fg="yellow"),
+        error_fn=lambda msg: _secho(f"ERROR: {msg}", fg="red")
     )
 
-    for i, url in enumerate(urls, 1):
-        click.secho(f"\nProcessing playlist {i}/{len(urls)}: {url}", fg="cyan")
+    if batch and not save_metadata:
+        if concurrent_downloads != 4 or concurrency != 1 or refresh_metadata:
+            _secho("WARNING: --batch ignores --concurrent, --concurrency and --refresh-metadata.", fg="yellow")
+        batch_urls = list(urls)
+        _secho(f"\nBatch-downloading {len(batch_urls)} playlist(s)", fg="cyan")
         progress_hook = CliProgressHook()
+        try:
+            retcode = downloader.download_batch(
+                playlist_urls=batch_urls,
+                output_dir=base_output_path,
+                quality=final_quality,
+                name_template=final_template,
+                cookies_file=cookies_file,
+                log_level=log_level,
+                progress_hook=progress_hook,
+                logger=cli_logger,
+                audio_format=audio_format,
+                concurrent_fragments=concurrent_fragments,
+            )
+        finally:
+            progress_hook.close()
+        if retcode:
+            _secho("Batch finished with errors; see messages above.", fg='red')
+        else:
+            _secho("Batch download finished.", fg='green')
+        return
+
+    # One hook for the whole run: it owns the single terminal line the bar is
+    # drawn on, including when -j N overlaps playlists.
+    progress_hook = CliProgressHook()
+    stop_event = threading.Event()
+
+    def process(i, url):
+        _secho(f"\nProcessing playlist {i}/{total_label}: {url}", fg="cyan")
         try:
             playlist_info = downloader.download_playlist(
                 playlist_url=url,
@@ -107,13 +251,28 @@ def download(playlist_urls, input_file, output_dir, quality, audio, to_mp3, name
                 save_metadata=save_metadata,
                 progress_hook=progress_hook,
                 logger=cli_logger,
-                audio_format=audio_format
+                audio_format=audio_format,
+                concurrent_downloads=concurrent_downloads,
+                refresh_metadata=refresh_metadata,
+                concurrent_fragments=concurrent_fragments,
+                pretty_metadata=pretty_metadata,
+                stop_event=stop_event,
             )
-            click.secho(f"Successfully downloaded playlist: '{playlist_info['title']}'", fg='green')
+            _secho(f"Successfully downloaded playlist: '{playlist_info['title']}'", fg='green')
         except (ValueError, RuntimeError) as e:
-            click.secho(str(e), fg='red')
-        finally:
-            progress_hook.close()
+            _secho(str(e), fg='red')
+
+    try:
+        if concurrency == 1:
+            # Run on the main thread so Ctrl-C lands in download_playlist directly.
+            for i, url in enumerate(urls, 1):
+                process(i, url)
+        else:
+            # Each playlist's info extraction is mostly network wait, so with
+            # -j N several overlap.
+            asyncio.run(_run_playlists(urls, concurrency, process, stop_event))
+    finally:
+        progress_hook.close()
 
 @cli.command()
 @click.option('--host', default=None, help='Host to bind (defaults to $UDOWN_HOST or 127.0.0.1)')
@@ -135,7 +294,9 @@ def web(host, port, debug):
 @click.option('--start-version', default=1, show_default=True, type=int)
 @click.option('--end-version', default=7, show_default=True, type=int)
 @click.option('--include-ext', multiple=True, default=('mp3',), show_default=True, help='Allowed extensions (repeatable), e.g. --include-ext mp3 --include-ext m4a')
-def format_versions(source_root, target_root, start_version, end_version, include_ext):
+@click.option('--link-mode', type=click.Choice(version_formatter.LINK_MODES), default='copy', show_default=True, help='How files land in the target: byte copy, hardlink, or reflink (copy-on-write clone). Falls back to copy.')
+@click.option('--workers', default=version_formatter.DEFAULT_COPY_WORKERS, show_default=True, type=click.IntRange(min=1), help='Files placed in parallel; use 1 on spinning disks.')
+def format_versions(source_root, target_root, start_version, end_version, include_ext, link_mode, workers):
     """Serially copy Version_1..N into one numbered folder for USB players."""
     allowed_suffixes = tuple(f".{ext.lower().lstrip('.')}" for ext in include_ext) if include_ext else ()
     total = version_formatter.format_versions(
@@ -144,6 +305,8 @@ def format_versions(source_root, target_root, start_version, end_version, includ
         start_version=start_version,
         end_version=end_version,
         allowed_suffixes=allowed_suffixes,
+        link_mode=link_mode,
+        workers=workers,
     )
     click.echo(f"Formatted {total} files into {target_root}")
 
@@ -44,24 +44,29 @@ document.addEventListener('DOMContentLoaded', () => {
                 });
                 
                 eventSource.addEventListener('new_video', (event) => {
-                    const videoTitle = event.data;
-                    const progressBar = `
-                        <div class="mb-2">
-                            <p class="mb-0">${videoTitle}</p>
-                            <div class="progress">
-                                <div class="progress-bar" role="progressbar" style="width: 0%;" aria-valuenow="0" aria-valuemin="0" aria-valuemax="100">0%</div>
-                            </div>
+                    const data = JSON.parse(event.data);
+                    const wrapper = document.createElement('div');
+                    wrapper.className = 'mb-2';
+                    wrapper.dataset.videoId = data.video_id;
+                    wrapper.innerHTML = `
+                        <p class="mb-0"></p>
+                        <div class="progress">
+                            <div class="progress-bar" role="progressbar" style="width: 0%;" aria-valuenow="0" aria-valuemin="0" aria-valuemax="100">0%</div>
                         </div>
                     `;
-                    videoProgressBarsContainer.innerHTML += progressBar;
+                    wrapper.querySelector('p').textContent = data.title;
+                    videoProgressBarsContainer.appendChild(wrapper);
                 });
 
                 eventSource.addEventListener('progress', (event) => {
                     const data = JSON.parse(event.data);
-                    const lastProgressBar = videoProgressBarsContainer.lastChild.querySelector('.progress-bar');
-                    if(lastProgressBar) {
-                        lastProgressBar.style.width = `${data.progress}%`;
-                        lastProgressBar.textContent = `${data.progress}%`;
+                    // Videos download in parallel, so route each update to its own bar.
+                    const wrapper = Array.from(videoProgressBarsContainer.children)
+                        .find((el) => el.dataset.videoId === data.video_id);
+                    const progressBar = wrapper && wrapper.querySelector('.progress-bar');
+                    if (progressBar) {
+                        progressBar.style.width = `${data.progress}%`;
+                        progressBar.textContent = `${data.progress}%`;
                     }
                 });
 
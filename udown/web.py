@@ -3,6 +3,7 @@ from __future__ import annotations
 import json
 import os
 import queue
+import re
 import threading
 import time
 import uuid
@@ -15,13 +16,51 @@ from flask import Flask, Response, abort, render_template, request
 from udown import downloader, version_formatter
 
 
-def _sse(event: str, data: str) -> str:
-    lines = str(data).splitlines() or [""]
+# Frames are encoded once where they are produced and travel the queue as
+# bytes, so werkzeug writes them to the socket without a per-chunk encode.
+_PROGRESS_PREFIX = b"event: progress\ndata: "
+_KEEPALIVE = b": keep-alive\n\n"
+_FINISHED = b"event: finished\ndata: close\n\n"
+_MAX_SSE_BATCH = 256  # queued events coalesced into one stream write
+_JSON_UNSAFE = re.compile(r'["\\\x00-\x1f]')
+
+
+def _json_str(value: Optional[str]) -> str:
+    """JSON-encode a string, skipping the encoder when no escaping is needed."""
+    if value is None:
+        return "null"
+    value = str(value)
+    if _JSON_UNSAFE.search(value):
+        # yt-dlp's speed/ETA strings can carry ANSI colour codes
+        return json.dumps(value)
+    return f'"{value}"'
+
+
+def _sse(event: str, data: str) -> bytes:
+    data = str(data)
+    if "\n" not in data and "\r" not in data:
+        return f"event: {event}\ndata: {data}\n\n".encode()
+    lines = data.splitlines() or [""]
     payload = "\n".join(f"data: {line}" for line in lines)
-    return f"event: {event}\n{payload}\n\n"
+    return f"event: {event}\n{payload}\n\n".encode()
+
+
+def _progress_frame(video_id: Optional[str], progress: float, d: dict) -> bytes:
+    # Fixed schema, so build the JSON directly instead of a dict + json.dumps;
+    # it is single-line, so the frame can be assembled without _sse() too.
+    payload = (
+        f'{{"video_id":{_json_str(video_id)},"progress":"{progress:.1f}",'
+        f'"speed":{_json_str(d.get("_speed_str", "N/A"))},"eta":{_json_str(d.get("_eta_str", "N/A"))}}}'
+    )
+    return _PROGRESS_PREFIX + payload.encode() + b"\n\n"
 
 
-def _queue_put(q: queue.Queue[str], message: str) -> None:
+def _queue_put(q: queue.Queue[bytes], message: bytes, droppable: bool = False) -> None:
+    # A slow or stalled SSE client must never block the download thread:
+    # progress frames are shed once the queue is half full (later ones supersede
+    # them), and anything else is dropped after a short wait if it is full.
+    if droppable and q.maxsize > 0 and q.qsize() > q.maxsize // 2:
+        return
     try:
         q.put(message, timeout=0.5)
     except queue.Full:
@@ -30,7 +69,7 @@ def _queue_put(q: queue.Queue[str], message: str) -> None:
 
 @dataclass(frozen=True)
 class Job:
-    queue: queue.Queue[str]
+    queue: queue.Queue[bytes]
     created_at: float
 
 
@@ -55,38 +94,58 @@ class JobManager:
 
 
 class WebProgressHook:
-    def __init__(self, q: queue.Queue[str]) -> None:
+    # Emit a progress frame at most every 100 ms per video, unless it moved by
+    # at least half a percent; each frame costs a JSON encode and a queue hop.
+    min_emit_interval = 0.1
+    min_emit_delta = 0.5
+
+    def __init__(self, q: queue.Queue[bytes]) -> None:
         self._queue = q
-        self._current_video_id: Optional[str] = None
+        self._last_emit: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
 
     def __call__(self, d: dict) -> None:
         status = d.get("status")
         if status == "downloading":
             info = d.get("info_dict") or {}
             video_id = info.get("id")
-            if video_id and self._current_video_id != video_id:
-                self._current_video_id = video_id
-                _queue_put(self._queue, _sse("new_video", info.get("title", video_id)))
-
             total_bytes = d.get("total_bytes") or d.get("total_bytes_estimate") or 0
             downloaded_bytes = d.get("downloaded_bytes") or 0
             progress = (downloaded_bytes / total_bytes) * 100 if total_bytes else 0
 
-            progress_data = {
-                "video_id": video_id,
-                "progress": f"{progress:.1f}",
-                "speed": d.get("_speed_str", "N/A"),
-                "eta": d.get("_eta_str", "N/A"),
-            }
-            _queue_put(self._queue, _sse("progress", json.dumps(progress_data)))
+            # Several entries download concurrently, so announce each video once
+            # and tag progress frames with its id for the client to route.
+            now = time.monotonic()
+            with self._lock:
+                last = self._last_emit.get(video_id)
+                if (
+                    last is not None
+                    and now - last[0] < self.min_emit_interval
+                    and progress - last[1] < self.min_emit_delta
+                    and downloaded_bytes != total_bytes
+                ):
+                    return
+                self._last_emit[video_id] = (now, progress)
+
+            if video_id and last is None:
+                new_video = {"video_id": video_id, "title": info.get("title", video_id)}
+                _queue_put(self._queue, _sse("new_video", json.dumps(new_video)))
+
+            _queue_put(self._queue, _progress_frame(video_id, progress, d), droppable=True)
 
         elif status == "finished":
             info = d.get("info_dict") or {}
+            video_id = info.get("id")
+            if video_id:
+                # The last "downloading" tick may have been throttled (sizes from
+                # total_bytes_estimate never hit the exact-total case), so always
+                # close the bar at 100%; this frame is never shed.
+                _queue_put(self._queue, _progress_frame(video_id, 100, d))
             _queue_put(self._queue, _sse("message", f"Download finished: {info.get('_filename', '')}"))
 
 
 def _download_task(
-    q: queue.Queue[str],
+    q: queue.Queue[bytes],
     playlist_url: str,
     options: dict,
     progress_hook: WebProgressHook,
@@ -105,12 +164,15 @@ def _download_task(
             progress_hook=progress_hook,
             logger=logger,
             audio_format=options.get("audio_format"),
+            # Web users can't ask for a refresh, so always list the playlist
+            # fresh; otherwise newly added videos stay hidden for up to an hour.
+            refresh_metadata=True,
         )
         _queue_put(q, _sse("message", f"Successfully downloaded playlist: '{playlist_info['title']}'"))
     except Exception as e:
         _queue_put(q, _sse("job_error", str(e)))
     finally:
-        _queue_put(q, _sse("finished", "close"))
+        _queue_put(q, _FINISHED)
 
 
 def create_app() -> Flask:
@@ -127,30 +189,38 @@ def create_app() -> Flask:
 
     @app.post("/download")
     def start_download():
-        playlist_url = request.form.get("playlist_url", "").strip()
+        # request.form is a lazily parsed MultiDict behind a context-local proxy;
+        # resolve it once and read plain locals from here on.
+        form = request.form
+        form_get = form.get
+        playlist_url = form_get("playlist_url", "").strip()
         if not playlist_url:
             return {"error": "Playlist URL is required."}, 400
 
-        quality = request.form.get("quality", "best")
+        to_mp3 = "to_mp3" in form
+        audio_only = "audio_only" in form
+        use_simple_serial = "simple_serial" in form
+        save_metadata = "save_metadata" in form
+
+        quality = form_get("quality", "best")
         audio_format = None
-        if "to_mp3" in request.form:
+        if to_mp3:
             quality = "audio-only"
             audio_format = "mp3"
-        elif "audio_only" in request.form:
+        elif audio_only:
             quality = "audio-only"
 
-        use_simple_serial = "simple_serial" in request.form
         name_template = (
             "{playlist_index:02d}.{ext}"
             if use_simple_serial
-            else request.form.get("name_template", "{playlist_index:02d} - {title}.{ext}")
+            else form_get("name_template", "{playlist_index:02d} - {title}.{ext}")
         )
 
         options = {
-            "output_dir": request.form.get("output_dir", "./downloads"),
+            "output_dir": form_get("output_dir", "./downloads"),
             "quality": quality,
             "name_template": name_template,
-            "save_metadata": "save_metadata" in request.form,
+            "save_metadata": save_metadata,
             "audio_format": audio_format,
         }
 
@@ -179,6 +249,7 @@ def create_app() -> Flask:
         target_root = Path(request.form.get("target_root", "./downloads/quran_Serailler_serialized"))
         start_version = int(request.form.get("start_version", 1))
         end_version = int(request.form.get("end_version", 7))
+        link_mode = request.form.get("link_mode", "copy")
 
         try:
             total = version_formatter.format_versions(
@@ -186,6 +257,7 @@ def create_app() -> Flask:
                 target_root=target_root,
                 start_version=start_version,
                 end_version=end_version,
+                link_mode=link_mode,
             )
             return {"message": f"Formatted {total} files into {target_root}"}
         except Exception as e:
@@ -203,10 +275,22 @@ def create_app() -> Flask:
                     try:
                         message = job.queue.get(timeout=15)
                     except queue.Empty:
-                        yield ": keep-alive\n\n"
+                        yield _KEEPALIVE
                         continue
-                    yield message
-                    if "event: finished" in message:
+                    # Drain whatever else is already queued and send it as one
+                    # write: fewer generator round-trips and socket writes when
+                    # events arrive faster than the client reads them.
+                    chunks = [message]
+                    finished = message.startswith(b"event: finished")
+                    while not finished and len(chunks) < _MAX_SSE_BATCH:
+                        try:
+                            message = job.queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        chunks.append(message)
+                        finished = message.startswith(b"event: finished")
+                    yield b"".join(chunks)
+                    if finished:
                         break
             finally:
                 jobs.pop(job_id)
@@ -225,4 +309,17 @@ def main(host: Optional[str] = None, port: Optional[int] = None, debug: Optional
     port = port or int(os.environ.get("UDOWN_PORT", "5000"))
     if debug is None:
         debug = os.environ.get("UDOWN_DEBUG", "").lower() in {"1", "true", "yes", "on"}
+    if not debug:
+        try:
+            import waitress
+        except ImportError:
+            pass
+        else:
+            # Every open SSE stream pins a worker thread for the whole download,
+            # so the pool size caps concurrent jobs; once it is used up even
+            # page requests queue behind them.
+            threads = int(os.environ.get("UDOWN_THREADS", "32"))
+            waitress.serve(app, host=host, port=port, threads=threads)
+            return
+    # The threaded dev server already speaks HTTP/1.1 with keep-alive.
     app.run(host=host, port=port, debug=debug, threaded=True)